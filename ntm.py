@@ -2,57 +2,171 @@
 # ntm.py — Network Traffic Monitor
 
 import psutil
+import os
 import time
 import sys
 import json
 import argparse
-from typing import Dict
+import collections
+from typing import Dict, NamedTuple, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 # ===================== UTILS =====================
 
-def humanize_bytes(value: float, rate: bool = False) -> str:
-    units = ["B", "KB", "MB", "GB", "TB"]
-    idx = 0
+_UNITS = ("B", "KB", "MB", "GB", "TB")
+_UNIT_DIVISORS = tuple(1 << (10 * i) for i in range(len(_UNITS)))
 
-    while value >= 1024 and idx < len(units) - 1:
-        value /= 1024
-        idx += 1
 
+def humanize_bytes(value: float, rate: bool = False) -> str:
     suffix = "/s" if rate else ""
-    return f"{value:.1f} {units[idx]}{suffix}"
+    if value < 1024:
+        return f"{value:.1f} B{suffix}"
+
+    # 1024 == 2**10, so the unit index is floor(log2(value)) // 10
+    idx = min((int(value).bit_length() - 1) // 10, len(_UNITS) - 1)
+    return f"{value / _UNIT_DIVISORS[idx]:.1f} {_UNITS[idx]}{suffix}"
 
 
 # ===================== DATA COLLECTOR =====================
 
-class TrafficCollector:
-    def __init__(self, iface: str, use_ema: bool = True, alpha: float = 0.2):
-        counters = psutil.net_io_counters(pernic=True)
-        if not counters:
-            raise RuntimeError("No network interfaces found")
+class Sample(NamedTuple):
+    # Field order is the JSON key order
+    iface: str
+    interval: float
+    sent_Bps: float
+    recv_Bps: float
+    sent_ema_Bps: float
+    recv_ema_Bps: float
+    ema_enabled: bool
+    ema_alpha: float
+    ema_window: Optional[int]
+    total_sent_B: int
+    total_recv_B: int
+    uptime: float
+    timestamp: float
+
 
+class TrafficCollector:
+    def __init__(
+        self,
+        iface: str,
+        use_ema: bool = True,
+        alpha: float = 0.2,
+        window: Optional[int] = None,
+    ):
         self.iface = iface
         self.use_ema = use_ema
         self.alpha = alpha
+        self._alpha = float(alpha)
+        self._one_minus_alpha = 1.0 - alpha
+
+        # On Linux a single interface is read straight from /proc/net/dev,
+        # skipping psutil's parse of every NIC into NamedTuples
+        self._proc_fd = None
+        if iface != "all" and sys.platform.startswith("linux"):
+            try:
+                self._proc_fd = os.open("/proc/net/dev", os.O_RDONLY)
+            except OSError:
+                pass
+            else:
+                self._proc_buf = bytearray(8192)
+                name = iface.encode()
+                self._proc_keys = (b"\n" + name + b":", b" " + name + b":")
 
-        self.start_time = time.time()
+        # Interval math runs on the monotonic clock so NTP steps can't
+        # produce negative or inflated intervals
+        self.start_time = time.monotonic()
         self.last_time = self.start_time
 
         self.start_counters = self._read_counters()
         self.prev_counters = self.start_counters.copy()
 
-        self.sent_ema = 0.0
-        self.recv_ema = 0.0
-        self.ema_initialized = False
+        # None until the first sample seeds the EMA with the raw rate
+        self.sent_ema = None
+        self.recv_ema = None
+
+        # Rolling window: S_t = phi*S_{t-1} + x_t - phi^N*x_{t-N}, same for
+        # the weight W_t; the average is S_t / W_t and costs O(1) per sample
+        self.window = window
+        if window:
+            self._ring = collections.deque(maxlen=window)
+            self._phi_n = self._one_minus_alpha ** window
+            self._sent_sum = 0.0
+            self._recv_sum = 0.0
+            self._weight = 0.0
+
+    def _window_average(self, sent_rate: float, recv_rate: float) -> Tuple[float, float]:
+        phi = self._one_minus_alpha
+        ring = self._ring
+
+        sent_sum = phi * self._sent_sum + sent_rate
+        recv_sum = phi * self._recv_sum + recv_rate
+        weight = phi * self._weight + 1.0
+
+        if len(ring) == ring.maxlen:
+            old_sent, old_recv = ring[0]
+            phi_n = self._phi_n
+            sent_sum -= phi_n * old_sent
+            recv_sum -= phi_n * old_recv
+            weight -= phi_n
+
+        ring.append((sent_rate, recv_rate))
+        self._sent_sum = sent_sum
+        self._recv_sum = recv_sum
+        self._weight = weight
+
+        return sent_sum / weight, recv_sum / weight
+
+    def _linux_read_proc_net_dev(self) -> Dict[str, int]:
+        # seq_file hands out about a page per read whatever the buffer size,
+        # so keep reading at increasing offsets until EOF, growing buf as we
+        # go. Counters are used as the kernel reports them: unlike psutil's
+        # nowrap mode, a wrap (32-bit counters on 32-bit kernels) is not
+        # compensated.
+        fd = self._proc_fd
+        buf = self._proc_buf
+        n = 0
+        while True:
+            if n == len(buf):
+                buf.extend(bytes(len(buf)))
+            read = os.preadv(fd, [memoryview(buf)[n:]], n)
+            if not read:
+                break
+            n += read
+
+        # Names are right-aligned to 6 columns, so a name is preceded by
+        # a space, or by the newline once it is 6 characters or longer
+        for key in self._proc_keys:
+            start = buf.find(key, 0, n)
+            if start != -1:
+                break
+        else:
+            raise ValueError(f"Interface '{self.iface}' not found")
+
+        start += len(key)
+        fields = buf[start:buf.find(b"\n", start, n)].split()
+        # Receive bytes is the first column, transmit bytes the ninth
+        return {"sent": int(fields[8]), "recv": int(fields[0])}
 
     def _read_counters(self) -> Dict[str, int]:
-        counters = psutil.net_io_counters(pernic=True)
+        if self._proc_fd is not None:
+            return self._linux_read_proc_net_dev()
 
         if self.iface == "all":
-            return {
-                "sent": sum(c.bytes_sent for c in counters.values()),
-                "recv": sum(c.bytes_recv for c in counters.values()),
-            }
+            # Aggregated counters are summed by psutil itself, no per-NIC dict
+            c = psutil.net_io_counters(pernic=False)
+            if c is None:
+                raise RuntimeError("No network interfaces found")
+            return {"sent": c.bytes_sent, "recv": c.bytes_recv}
+
+        counters = psutil.net_io_counters(pernic=True)
+        if not counters:
+            raise RuntimeError("No network interfaces found")
 
         if self.iface not in counters:
             raise ValueError(f"Interface '{self.iface}' not found")
@@ -60,139 +174,216 @@ class TrafficCollector:
         c = counters[self.iface]
         return {"sent": c.bytes_sent, "recv": c.bytes_recv}
 
-    def sample(self) -> dict:
-        now = time.time()
+    def sample(self) -> Sample:
+        now = time.monotonic()
+        wall_time = time.time()
         interval = max(now - self.last_time, 0.01)
 
         try:
             current = self._read_counters()
-        except (ValueError, KeyError):
+        except (ValueError, KeyError, RuntimeError):
             print("Network interface lost. Exiting.")
             sys.exit(1)
 
-        sent_rate = (current["sent"] - self.prev_counters["sent"]) / interval
-        recv_rate = (current["recv"] - self.prev_counters["recv"]) / interval
-
-        if self.use_ema:
-            if not self.ema_initialized:
-                self.sent_ema = sent_rate
-                self.recv_ema = recv_rate
-                self.ema_initialized = True
-            else:
-                self.sent_ema = self.alpha * sent_rate + (1 - self.alpha) * self.sent_ema
-                self.recv_ema = self.alpha * recv_rate + (1 - self.alpha) * self.recv_ema
+        # State read more than once below is loaded into locals up front
+        # and written back once; single-use attributes are left inline
+        use_ema = self.use_ema
+        window = self.window
+        sent_ema = self.sent_ema
+        recv_ema = self.recv_ema
+        alpha = self._alpha
+        oma = self._one_minus_alpha
+        cur_sent = current["sent"]
+        cur_recv = current["recv"]
+
+        sent_rate = (cur_sent - self.prev_counters["sent"]) / interval
+        recv_rate = (cur_recv - self.prev_counters["recv"]) / interval
+
+        if use_ema and window:
+            sent_ema, recv_ema = self._window_average(sent_rate, recv_rate)
+        elif use_ema and sent_ema is not None:
+            sent_ema = alpha * sent_rate + oma * sent_ema
+            recv_ema = alpha * recv_rate + oma * recv_ema
         else:
-            self.sent_ema = sent_rate
-            self.recv_ema = recv_rate
-
-        total_sent = current["sent"] - self.start_counters["sent"]
-        total_recv = current["recv"] - self.start_counters["recv"]
+            sent_ema = sent_rate
+            recv_ema = recv_rate
 
+        self.sent_ema = sent_ema
+        self.recv_ema = recv_ema
         self.prev_counters = current
         self.last_time = now
 
-        return {
-            "iface": self.iface,
-            "interval": interval,
-            "sent_Bps": sent_rate,
-            "recv_Bps": recv_rate,
-            "sent_ema_Bps": self.sent_ema,
-            "recv_ema_Bps": self.recv_ema,
-            "ema_enabled": self.use_ema,
-            "ema_alpha": self.alpha,
-            "total_sent_B": total_sent,
-            "total_recv_B": total_recv,
-            "uptime": now - self.start_time,
-            "timestamp": now,
-        }
+        return Sample(
+            self.iface,
+            interval,
+            sent_rate,
+            recv_rate,
+            sent_ema,
+            recv_ema,
+            use_ema,
+            self.alpha,
+            window,
+            cur_sent - self.start_counters["sent"],
+            cur_recv - self.start_counters["recv"],
+            now - self.start_time,
+            wall_time,
+        )
 
 
 # ===================== RENDERERS =====================
 
-class Renderer:
-    def render(self, data: dict):
-        raise NotImplementedError
-
-
-class PlainRenderer(Renderer):
-    def render(self, d: dict):
+class PlainRenderer:
+    def render(self, d: Sample):
         print(
-            f"[{time.strftime('%H:%M:%S')}] "
-            f"OUT {humanize_bytes(d['sent_Bps'], True)} | "
-            f"IN {humanize_bytes(d['recv_Bps'], True)} | "
-            f"TOTAL {humanize_bytes(d['total_sent_B'])}/"
-            f"{humanize_bytes(d['total_recv_B'])}"
+            f"[{time.strftime('%H:%M:%S', time.localtime(d.timestamp))}] "
+            f"OUT {humanize_bytes(d.sent_Bps, True)} | "
+            f"IN {humanize_bytes(d.recv_Bps, True)} | "
+            f"TOTAL {humanize_bytes(d.total_sent_B)}/"
+            f"{humanize_bytes(d.total_recv_B)}"
         )
 
 
-class JsonRenderer(Renderer):
-    def render(self, d: dict):
-        print(json.dumps(d, ensure_ascii=False))
+class JsonRenderer:
+    def __init__(self):
+        # Mirror print(): flush per line on a tty, stay block-buffered in pipes
+        self._flush = getattr(sys.stdout, "line_buffering", False)
+
+    def render(self, d: Sample):
+        if orjson is None:
+            # Same compact separators as orjson, so lines match either way
+            print(json.dumps(d._asdict(), ensure_ascii=False, separators=(",", ":")))
+            return
 
+        # orjson returns UTF-8 bytes, so skip the text layer entirely
+        out = sys.stdout.buffer
+        out.write(orjson.dumps(d._asdict(), option=orjson.OPT_APPEND_NEWLINE))
+        if self._flush:
+            out.flush()
 
-class AnsiRenderer(Renderer):
-    def __init__(self, view: str = "both"):
-        self.view = view
+
+class AnsiRenderer:
+    # "ema" and "raw" share one layout; they differ only in which speeds
+    # their render method passes in
+    SINGLE_SPEED_LINES = (
+        "  OUT: \033[32m%12b\033[0m\n"
+        "  IN:  \033[36m%12b\033[0m\n"
+    )
+    SPEED_LINES = {
+        "both": (
+            "  OUT: raw \033[90m%10b\033[0m | avg \033[32m%10b\033[0m\n"
+            "  IN:  raw \033[90m%10b\033[0m | avg \033[36m%10b\033[0m\n"
+        ),
+        "ema": SINGLE_SPEED_LINES,
+        "raw": SINGLE_SPEED_LINES,
+    }
+
+    def __init__(self, view: str = "both", iface: str = "all"):
         self.max_sent = 1.0
         self.max_recv = 1.0
         self.bar_width = 50
+        # Only bar_width + 1 distinct bars exist, so they are built once
+        self._bar_cache = tuple(
+            ("█" * f + " " * (self.bar_width - f)).encode("utf-8")
+            for f in range(self.bar_width + 1)
+        )
 
-    def _bar(self, value, max_value):
-        ratio = min(value / max_value, 1.0)
-        filled = int(ratio * self.bar_width)
-        return "█" * filled + " " * (self.bar_width - filled)
-
-    def render(self, d: dict):
-        sys.stdout.write("\033[2J\033[H")
-
-        raw_sent = d["sent_Bps"]
-        raw_recv = d["recv_Bps"]
-        ema_sent = d["sent_ema_Bps"]
-        ema_recv = d["recv_ema_Bps"]
-
-        if self.view == "raw":
-            bar_sent, bar_recv = raw_sent, raw_recv
-        else:
-            bar_sent, bar_recv = ema_sent, ema_recv
-
-        self.max_sent = max(self.max_sent, bar_sent)
-        self.max_recv = max(self.max_recv, bar_recv)
-
-        mode = self.view.upper()
-        print("\033[1;34m" + "=" * 60)
-        print(f"NETWORK TRAFFIC [{d['iface']}] ({mode})".center(60))
-        print("=" * 60 + "\033[0m\n")
-
-        print("\033[1mCurrent Speed:\033[0m")
-
-        if self.view == "both":
-            print(
-                f"  OUT: raw \033[90m{humanize_bytes(raw_sent, True):>10}\033[0m | "
-                f"avg \033[32m{humanize_bytes(ema_sent, True):>10}\033[0m"
-            )
-            print(
-                f"  IN:  raw \033[90m{humanize_bytes(raw_recv, True):>10}\033[0m | "
-                f"avg \033[36m{humanize_bytes(ema_recv, True):>10}\033[0m"
-            )
-        elif self.view == "ema":
-            print(f"  OUT: \033[32m{humanize_bytes(ema_sent, True):>12}\033[0m")
-            print(f"  IN:  \033[36m{humanize_bytes(ema_recv, True):>12}\033[0m")
-        else:
-            print(f"  OUT: \033[32m{humanize_bytes(raw_sent, True):>12}\033[0m")
-            print(f"  IN:  \033[36m{humanize_bytes(raw_recv, True):>12}\033[0m")
-
-        print("\n\033[1mTraffic Level:\033[0m")
-        print(f"  OUT [\033[32m{self._bar(bar_sent, self.max_sent)}\033[0m]")
-        print(f"  IN  [\033[36m{self._bar(bar_recv, self.max_recv)}\033[0m]")
-
-        print("\n\033[1mTotal since start:\033[0m")
-        print(f"  Sent: {humanize_bytes(d['total_sent_B'])}")
-        print(f"  Recv: {humanize_bytes(d['total_recv_B'])}")
-        print(f"  Time: {int(d['uptime'])} sec")
+        # iface and view are fixed for the session, so the header is baked
+        # into a single pre-encoded template; each frame is one bytes
+        # %-format and one write() on the raw stdout fd
+        header = f"NETWORK TRAFFIC [{iface}] ({view.upper()})".center(60)
+        body = (
+            "\033[1;34m" + "=" * 60 + "\n"
+            + header.replace("%", "%%") + "\n"
+            + "=" * 60 + "\033[0m\n\n"
+            "\033[1mCurrent Speed:\033[0m\n"
+            + self.SPEED_LINES[view]
+            + "\n\033[1mTraffic Level:\033[0m\n"
+            "  OUT [\033[32m%b\033[0m]\n"
+            "  IN  [\033[36m%b\033[0m]\n"
+            "\n\033[1mTotal since start:\033[0m\n"
+            "  Sent: %b\n"
+            "  Recv: %b\n"
+            "  Time: %d sec\n"
+            "\n\033[90m" + "-" * 60 + "\n"
+            "Ctrl+C to exit | %b\n"
+        )
+        # The layout is fixed, so frames are redrawn in place: home the
+        # cursor and erase each line's tail rather than clearing the whole
+        # screen. The cursor is hidden while the frame is drawn.
+        self._template = (
+            "\033[?25l\033[H" + body.replace("\n", "\033[K\n") + "\033[?25h"
+        ).encode("utf-8")
+        # Residual terminal content is cleared by the first frame only
+        self._cleared = False
+        self._fd = sys.stdout.fileno()
+
+        # The view never changes, so pick its render body once instead of
+        # branching on it every frame
+        self.render = {
+            "both": self._render_both,
+            "ema": self._render_ema,
+            "raw": self._render_raw,
+        }[view]
 
-        print("\n\033[90m" + "-" * 60)
-        print("Ctrl+C to exit | " + time.strftime("%H:%M:%S"))
-        sys.stdout.flush()
+    def _bar(self, value, max_value):
+        filled = min(int((value / max_value) * self.bar_width), self.bar_width)
+        return self._bar_cache[max(filled, 0)]
+
+    def _write(self, payload: bytes):
+        while payload:
+            payload = payload[os.write(self._fd, payload):]
+
+    def close(self):
+        # A frame interrupted mid-write leaves the cursor hidden
+        self._write(b"\033[?25h")
+
+    def _emit(self, d: Sample, bar_sent: float, bar_recv: float, speeds: tuple):
+        max_sent = self.max_sent = max(self.max_sent, bar_sent)
+        max_recv = self.max_recv = max(self.max_recv, bar_recv)
+
+        hb = humanize_bytes
+        bar = self._bar
+        payload = self._template % (speeds + (
+            bar(bar_sent, max_sent),
+            bar(bar_recv, max_recv),
+            hb(d.total_sent_B).encode(),
+            hb(d.total_recv_B).encode(),
+            int(d.uptime),
+            time.strftime("%H:%M:%S", time.localtime(d.timestamp)).encode(),
+        ))
+        if not self._cleared:
+            payload = b"\033[2J" + payload
+            self._cleared = True
+        self._write(payload)
+
+    def _render_both(self, d: Sample):
+        hb = humanize_bytes
+        ema_sent = d.sent_ema_Bps
+        ema_recv = d.recv_ema_Bps
+        self._emit(d, ema_sent, ema_recv, (
+            hb(d.sent_Bps, True).encode(),
+            hb(ema_sent, True).encode(),
+            hb(d.recv_Bps, True).encode(),
+            hb(ema_recv, True).encode(),
+        ))
+
+    def _render_ema(self, d: Sample):
+        hb = humanize_bytes
+        ema_sent = d.sent_ema_Bps
+        ema_recv = d.recv_ema_Bps
+        self._emit(d, ema_sent, ema_recv, (
+            hb(ema_sent, True).encode(),
+            hb(ema_recv, True).encode(),
+        ))
+
+    def _render_raw(self, d: Sample):
+        hb = humanize_bytes
+        raw_sent = d.sent_Bps
+        raw_recv = d.recv_Bps
+        self._emit(d, raw_sent, raw_recv, (
+            hb(raw_sent, True).encode(),
+            hb(raw_recv, True).encode(),
+        ))
 
 
 # ===================== CLI =====================
@@ -210,6 +401,14 @@ def main():
     parser.add_argument("--ema", action="store_true", default=True)
     parser.add_argument("--no-ema", action="store_true", help="Disable EMA")
     parser.add_argument("--ema-alpha", type=float, default=0.2)
+    parser.add_argument(
+        "--window",
+        type=int,
+        help=(
+            "Average over the last N samples (weighted by EMA alpha); only "
+            "differs visibly from plain EMA when (1 - alpha)^N is not negligible"
+        )
+    )
 
     parser.add_argument(
         "--view",
@@ -225,10 +424,19 @@ def main():
         print("EMA alpha must be between 0 and 1")
         sys.exit(1)
 
+    if args.window is not None and args.window < 1:
+        print("Window must be at least 1 sample")
+        sys.exit(1)
+
+    if args.window is not None and not use_ema:
+        print("--window requires EMA; it cannot be combined with --no-ema")
+        sys.exit(1)
+
     collector = TrafficCollector(
         args.iface,
         use_ema=use_ema,
-        alpha=args.ema_alpha
+        alpha=args.ema_alpha,
+        window=args.window
     )
 
     if args.json:
@@ -236,23 +444,38 @@ def main():
     elif args.plain:
         renderer = PlainRenderer()
     else:
-        renderer = AnsiRenderer(view=args.view)
+        renderer = AnsiRenderer(view=args.view, iface=args.iface)
+
+    # Bound once so the loop makes a direct call per frame
+    render = renderer.render
+    sample = collector.sample
 
     iterations = 1 if args.once else args.count
     i = 0
+    next_deadline = time.monotonic()
 
     try:
         while True:
-            data = collector.sample()
-            renderer.render(data)
+            render(sample())
             i += 1
 
             if iterations is not None and i >= iterations:
                 break
 
-            time.sleep(args.interval)
+            # Sleep to an absolute deadline so render time doesn't stretch
+            # the period; after an overrun restart from now rather than
+            # firing a burst of back-to-back samples to catch up
+            next_deadline += args.interval
+            remaining = next_deadline - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            else:
+                next_deadline = time.monotonic()
     except KeyboardInterrupt:
         print("\nStopped.")
+    finally:
+        if isinstance(renderer, AnsiRenderer):
+            renderer.close()
 
 
 if __name__ == "__main__":